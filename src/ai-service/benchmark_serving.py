@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Serving benchmark for the IFTAA AI service
+
+Starts serve.py for each worker count (preloaded and, with --compare, per-worker
+models), drives /api/search with distinct queries so every request encodes its
+query, and reports throughput, latency and memory:
+
+    python benchmark_serving.py --workers 1 2 4 --duration 30 --concurrency 16 --compare
+
+RSS counts shared pages once per process; PSS splits them between the processes
+sharing them, so total PSS is the real footprint of the worker group.
+"""
+
+import os
+import sys
+import time
+import argparse
+import itertools
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import psutil
+import requests
+
+QUERIES = [
+    "حكم الصلاة في السفر", "زكاة الذهب", "صيام المريض", "حكم الربا", "الطلاق في الإسلام",
+    "prayer while traveling", "zakat on gold", "fasting when sick", "ruling on interest", "divorce in islam"
+]
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, workers: int, timeout: float) -> float:
+    """Seconds until every worker process is up and /health answers"""
+    start = time.perf_counter()
+    parent = psutil.Process(process.pid)
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve.py exited with code {process.returncode}")
+        try:
+            if len(parent.children()) >= workers and requests.get(f"{base_url}/health", timeout=5).status_code == 200:
+                return time.perf_counter() - start
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"service not ready after {timeout}s")
+
+def memory_of(process: subprocess.Popen) -> dict:
+    """RSS and PSS in MB of the master and its workers"""
+    processes = [psutil.Process(process.pid)]
+    processes += processes[0].children(recursive=True)
+    rss = pss = 0
+    for proc in processes:
+        try:
+            info = proc.memory_full_info()
+            rss += info.rss
+            pss += getattr(info, "pss", info.rss)
+        except psutil.Error:
+            pass
+    return {"rss_mb": rss / 2**20, "pss_mb": pss / 2**20}
+
+def drive_load(base_url: str, duration: float, concurrency: int) -> dict:
+    """Closed-loop load: `concurrency` clients each send one request at a time"""
+    counter = itertools.count()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        nonlocal errors
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            n = next(counter)
+            # A distinct query per request: no embedding or result cache hits
+            query = f"{QUERIES[n % len(QUERIES)]} {n}"
+            start = time.perf_counter()
+            try:
+                ok = session.get(f"{base_url}/api/search", params={"query": query, "page_size": 10}, timeout=60).ok
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    wall = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / wall,
+        "p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else 0.0,
+        "p95_ms": float(np.percentile(latencies_ms, 95)) if len(latencies_ms) else 0.0,
+    }
+
+def run_case(workers: int, preload: bool, args) -> dict:
+    bind = f"127.0.0.1:{args.port}"
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py"),
+               "--workers", str(workers), "--bind", bind]
+    if not preload:
+        command.append("--no-preload")
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f"http://{bind}"
+        startup = wait_until_ready(base_url, process, workers, args.startup_timeout)
+        # Warm up every worker before measuring
+        drive_load(base_url, args.warmup, args.concurrency)
+        load = drive_load(base_url, args.duration, args.concurrency)
+        return {"workers": workers, "preload": preload, "startup_s": startup, **load, **memory_of(process)}
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preload-and-fork serving of the IFTAA AI service")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to measure")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per case")
+    parser.add_argument("--warmup", type=float, default=5, help="Warm-up seconds per case")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--port", type=int, default=5099, help="Port for the benchmarked service")
+    parser.add_argument("--startup-timeout", type=float, default=600, help="Seconds to wait for the service")
+    parser.add_argument("--compare", action="store_true", help="Also measure per-worker model loading")
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        for preload in ([True, False] if args.compare else [True]):
+            print(f"⏱️  {workers} worker(s), {'preloaded' if preload else 'per-worker'} models...", flush=True)
+            results.append(run_case(workers, preload, args))
+
+    header = f"{'workers':>7} {'models':>10} {'startup s':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} " \
+             f"{'errors':>6} {'RSS MB':>8} {'PSS MB':>8} {'PSS/worker':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['workers']:>7} {'preloaded' if r['preload'] else 'per-worker':>10} {r['startup_s']:>9.1f} "
+              f"{r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['errors']:>6} "
+              f"{r['rss_mb']:>8.0f} {r['pss_mb']:>8.0f} {r['pss_mb'] / r['workers']:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Search Bundle Builder for IFTAA System
+Writes the in-memory corpus columns of all active fatwas, with the spelling index,
+relevance features and snippet positions of the same fatwas, to a new version of the
+search bundle directory, which AI service workers (CORPUS_MODE=memory) open with
+mmap and switch to as soon as its CURRENT pointer changes
+"""
+
+import os
+import sys
+import logging
+import argparse
+from pymongo import MongoClient
+
+from semantic_search_service import Config, MemoryCorpus
+
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped search bundle for the IFTAA AI service")
+    parser.add_argument("--root", default=Config.SEARCH_BUNDLE_DIR, help="Bundle directory (default: SEARCH_BUNDLE_DIR)")
+    parser.add_argument("--keep", type=int, default=3, help="Number of bundle versions to keep")
+    args = parser.parse_args()
+
+    if not args.root:
+        logger.error("❌ No bundle directory: pass --root or set SEARCH_BUNDLE_DIR")
+        sys.exit(1)
+
+    try:
+        os.makedirs(args.root, exist_ok=True)
+        client = MongoClient(Config.MONGODB_URI, serverSelectionTimeoutMS=5000)
+        version = MemoryCorpus.build_bundle(client[Config.MONGODB_DATABASE].fatwas, args.root, args.keep)
+    except Exception as e:
+        logger.error(f"❌ Search bundle build failed: {e}")
+        sys.exit(1)
+
+    logger.info(f"🎉 Search bundle {version} is current in {args.root}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Model inference pool for the IFTAA AI service
+
+    python inference_pool.py --processes 2 --address /tmp/iftaa-inference.sock
+
+Runs the embedding and translation models in dedicated processes. API processes
+(INFERENCE_POOL_ADDRESS set) hold no models: they connect to the pool's local
+queue server and exchange only small request/reply tuples with it. Texts and
+vectors travel through a shared-memory segment owned by each API process, one
+fixed-size slot per in-flight request.
+
+Connections are authenticated with INFERENCE_POOL_AUTHKEY or, when it is unset,
+with a random key the pool writes to a 0600 file beside its socket.
+
+The pool's request queue is shared by every API process and ordered by priority
+class (interactive, admin, bulk), then by arrival.
+"""
+
+import os
+import sys
+import time
+import queue
+import secrets
+import struct
+import signal
+import logging
+import argparse
+import itertools
+import threading
+import uuid
+import multiprocessing
+from multiprocessing.managers import BaseManager
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_PAIRS = (("ar", "en"), ("en", "ar"))
+# Request classes, most urgent first
+PRIORITIES = ("interactive", "admin", "bulk")
+
+class PoolManager(BaseManager):
+    """Local queue server shared by the pool processes and the API processes"""
+
+PoolManager.register("requests")
+PoolManager.register("replies")
+
+# --- Slot encoding ---
+
+def pack_texts(buffer: memoryview, texts: List[str]) -> int:
+    """Write texts as count, lengths and UTF-8 bytes; returns the bytes used"""
+    encoded = [text.encode("utf-8") for text in texts]
+    header = struct.pack(f"<I{len(encoded)}I", len(encoded), *(len(data) for data in encoded))
+    size = len(header) + sum(len(data) for data in encoded)
+    if size > len(buffer):
+        raise ValueError(f"{size} bytes of text do not fit an inference slot of {len(buffer)} bytes")
+    buffer[:len(header)] = header
+    position = len(header)
+    for data in encoded:
+        buffer[position:position + len(data)] = data
+        position += len(data)
+    return size
+
+def unpack_texts(buffer: memoryview) -> List[str]:
+    (count,) = struct.unpack_from("<I", buffer, 0)
+    lengths = struct.unpack_from(f"<{count}I", buffer, 4)
+    texts = []
+    position = 4 + 4 * count
+    for length in lengths:
+        texts.append(bytes(buffer[position:position + length]).decode("utf-8"))
+        position += length
+    return texts
+
+# --- Authentication ---
+
+def authkey_path(address: str) -> str:
+    """Key file the pool writes beside its socket when no key is configured"""
+    return f"{address}.key"
+
+def create_authkey(path: str) -> bytes:
+    """Write a new random key readable only by this user"""
+    key = secrets.token_hex(32).encode("ascii")
+    staging = f"{path}.tmp"
+    if os.path.exists(staging):
+        os.unlink(staging)
+    with os.fdopen(os.open(staging, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as key_file:
+        key_file.write(key)
+    os.replace(staging, path)
+    return key
+
+def read_authkey(path: str) -> bytes:
+    with open(path, "rb") as key_file:
+        return key_file.read().strip()
+
+def attach_segment(name: str) -> SharedMemory:
+    """Open a segment created by another process without taking over its cleanup"""
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 every attach registers the segment for unlinking at exit
+        from multiprocessing import resource_tracker
+        segment = SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+# --- API process side ---
+
+class InferenceClient:
+    """
+    Connection of one API process to the inference pool. encode() mirrors
+    SentenceTransformer.encode so the client stands in for the embedding model.
+
+    Every request carries its expiry time: the pool skips a request, and writes
+    no result, once it has expired, so the client reclaims the slot of a request
+    whose reply never comes (its pool process died) shortly after that.
+    """
+
+    # Seconds past a request's expiry before its slot is reclaimed without a reply
+    EXPIRY_GRACE = 1.0
+
+    def __init__(self, address: str, authkey: Optional[bytes], slots: int, slot_bytes: int, timeout: float,
+                 connect_timeout: float = 60):
+        self.address = address
+        self.slot_bytes = slot_bytes
+        self.timeout = timeout
+        self.client_id = uuid.uuid4().hex
+
+        # Without a configured key, read the one the pool wrote (it may not be there or current yet)
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                manager = PoolManager(address=address, authkey=authkey or read_authkey(authkey_path(address)))
+                manager.connect()
+                break
+            except (FileNotFoundError, ConnectionRefusedError, multiprocessing.AuthenticationError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(1)
+        self.requests = manager.requests()
+        self.replies = manager.replies(self.client_id)
+
+        self.segment = SharedMemory(create=True, size=slots * slot_bytes)
+        self.free_slots: "queue.Queue[int]" = queue.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+        self.lock = threading.Lock()
+        self.pending: Dict[int, tuple] = {}
+        self.request_ids = itertools.count()
+        self.completed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.expired = 0
+
+        threading.Thread(target=self._dispatch, name="inference-replies", daemon=True).start()
+        logger.info(f"🔌 Connected to inference pool at {address} ({slots} slots of {slot_bytes} bytes)")
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False,
+               priority: str = "interactive", **kwargs) -> np.ndarray:
+        """Embeddings of a text (1-D) or a list of texts (2-D), computed by the pool"""
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        batches = []
+        # One request per batch keeps every output within a slot
+        for start in range(0, len(texts), batch_size):
+            shape, slot = self._call("encode", texts[start:start + batch_size],
+                                     {"normalize_embeddings": normalize_embeddings}, priority)
+            try:
+                count = int(np.prod(shape))
+                batches.append(np.frombuffer(self._slot(slot), dtype=np.float32, count=count).reshape(shape).copy())
+            finally:
+                self.free_slots.put(slot)
+        vectors = np.concatenate(batches) if batches else np.empty((0, 0), dtype=np.float32)
+        return vectors[0] if isinstance(sentences, str) else vectors
+
+    def translate(self, texts: List[str], source_lang: str, target_lang: str, priority: str = "interactive") -> List[str]:
+        _, slot = self._call("translate", texts, {"source_lang": source_lang, "target_lang": target_lang}, priority)
+        try:
+            return unpack_texts(self._slot(slot))
+        finally:
+            self.free_slots.put(slot)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "completed": self.completed,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "expired": self.expired,
+            "in_flight": len(self.pending),
+            "free_slots": self.free_slots.qsize()
+        }
+
+    def close(self) -> None:
+        self.replies.put(None)
+        self.segment.close()
+        self.segment.unlink()
+
+    def _slot(self, slot: int) -> memoryview:
+        return self.segment.buf[slot * self.slot_bytes:(slot + 1) * self.slot_bytes]
+
+    def _call(self, operation: str, texts: List[str], options: dict, priority: str = "interactive") -> tuple:
+        """Run one request; returns (result shape, slot holding the output), the slot still reserved"""
+        try:
+            slot = self.free_slots.get(timeout=self.timeout)
+        except queue.Empty:
+            self.timeouts += 1
+            raise TimeoutError("no free inference slot")
+        try:
+            pack_texts(self._slot(slot), texts)
+        except Exception:
+            self.free_slots.put(slot)
+            raise
+
+        request_id = next(self.request_ids)
+        future: Future = Future()
+        expires = time.time() + self.timeout
+        with self.lock:
+            self.pending[request_id] = (slot, future, expires)
+        # Ordered by class, then arrival; the client and request ids make every entry distinct
+        rank = PRIORITIES.index(priority) if priority in PRIORITIES else len(PRIORITIES)
+        self.requests.put((rank, time.time(), self.client_id, request_id, self.segment.name, slot, self.slot_bytes,
+                           operation, options, expires))
+        try:
+            status, result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # The slot is released by the dispatcher once the late reply arrives, or the request expires
+            self.timeouts += 1
+            future.cancel()
+            raise TimeoutError(f"inference {operation} took longer than {self.timeout}s")
+        if status != "ok":
+            self.free_slots.put(slot)
+            self.errors += 1
+            raise RuntimeError(f"inference {operation} failed: {result}")
+        self.completed += 1
+        return result, slot
+
+    def _dispatch(self) -> None:
+        while True:
+            try:
+                reply = self.replies.get(timeout=self.EXPIRY_GRACE)
+            except queue.Empty:
+                reply = ()
+            if reply is None:
+                return
+            if reply:
+                request_id, status, result = reply
+                with self.lock:
+                    slot, future, _ = self.pending.pop(request_id, (None, None, None))
+                if future is not None:
+                    self._resolve(slot, future, status, result)
+            self._expire()
+
+    def _expire(self) -> None:
+        """Fail the requests whose reply is overdue: the pool no longer writes their slots"""
+        now = time.time()
+        with self.lock:
+            overdue = [request_id for request_id, (_, _, expires) in self.pending.items() if now > expires + self.EXPIRY_GRACE]
+            entries = [self.pending.pop(request_id) for request_id in overdue]
+        for slot, future, _ in entries:
+            self.expired += 1
+            self._resolve(slot, future, "error", "request expired without a reply")
+
+    def _resolve(self, slot: int, future: Future, status: str, result) -> None:
+        if not future.set_running_or_notify_cancel():
+            # The caller gave up waiting
+            self.free_slots.put(slot)
+            return
+        future.set_result((status, result))
+
+# --- Pool side ---
+
+def run_worker(address: str, authkey: bytes, threads: int) -> None:
+    """Pool process: load the models, then serve requests until terminated"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from transformers import MarianMTModel, MarianTokenizer
+    from semantic_search_service import Config
+
+    torch.set_num_threads(threads)
+    embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
+    translators = {
+        ("ar", "en"): (MarianTokenizer.from_pretrained(Config.TRANSLATION_MODEL_AR_EN),
+                       MarianMTModel.from_pretrained(Config.TRANSLATION_MODEL_AR_EN)),
+        ("en", "ar"): (MarianTokenizer.from_pretrained(Config.TRANSLATION_MODEL_EN_AR),
+                       MarianMTModel.from_pretrained(Config.TRANSLATION_MODEL_EN_AR))
+    }
+
+    manager = PoolManager(address=address, authkey=authkey)
+    manager.connect()
+    requests = manager.requests()
+    replies = {}
+    segments: Dict[str, SharedMemory] = {}
+    logger.info(f"🧮 Inference worker {os.getpid()} ready with {threads} torch threads")
+
+    while True:
+        _, _, client_id, request_id, segment_name, slot, slot_bytes, operation, options, expires = requests.get()
+        try:
+            # The client reclaims an expired request's slot: never touch it after that
+            if time.time() > expires:
+                raise TimeoutError("request expired before it was run")
+            if segment_name not in segments:
+                segments[segment_name] = attach_segment(segment_name)
+            buffer = segments[segment_name].buf[slot * slot_bytes:(slot + 1) * slot_bytes]
+            texts = unpack_texts(buffer)
+            with torch.inference_mode():
+                if operation == "encode":
+                    vectors = np.ascontiguousarray(embedding_model.encode(
+                        texts, batch_size=len(texts), normalize_embeddings=options["normalize_embeddings"]
+                    ), dtype=np.float32)
+                    if vectors.nbytes > slot_bytes:
+                        raise ValueError(f"{vectors.nbytes} bytes of embeddings do not fit an inference slot")
+                    if time.time() > expires:
+                        raise TimeoutError("request expired while it ran")
+                    buffer[:vectors.nbytes] = vectors.tobytes()
+                    result = vectors.shape
+                elif operation == "translate":
+                    tokenizer, model = translators[(options["source_lang"], options["target_lang"])]
+                    inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=512)
+                    translations = tokenizer.batch_decode(model.generate(**inputs), skip_special_tokens=True)
+                    if time.time() > expires:
+                        raise TimeoutError("request expired while it ran")
+                    pack_texts(buffer, translations)
+                    result = None
+                else:
+                    raise ValueError(f"unknown operation {operation}")
+            reply = (request_id, "ok", result)
+        except Exception as e:
+            reply = (request_id, "error", str(e))
+        if client_id not in replies:
+            replies[client_id] = manager.replies(client_id)
+        replies[client_id].put(reply)
+
+def serve_pool(address: str, authkey: bytes, processes: int) -> None:
+    """Queue server plus `processes` inference workers, restarted when they die"""
+    requests = queue.PriorityQueue()
+    reply_queues: Dict[str, queue.Queue] = {}
+    PoolManager.register("requests", callable=lambda: requests)
+    PoolManager.register("replies", callable=lambda client_id: reply_queues.setdefault(client_id, queue.Queue()))
+
+    if os.path.exists(address):
+        os.unlink(address)
+    server = PoolManager(address=address, authkey=authkey).get_server()
+    threading.Thread(target=server.serve_forever, name="inference-queues", daemon=True).start()
+
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    threads = max(1, cores // processes)
+    context = multiprocessing.get_context("spawn")
+    workers: List[Optional[multiprocessing.Process]] = [None] * processes
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    logger.info(f"🚀 Inference pool listening on {address} with {processes} workers x {threads} torch threads")
+
+    try:
+        while not stopping.is_set():
+            for index, worker in enumerate(workers):
+                if worker is None or not worker.is_alive():
+                    if worker is not None:
+                        logger.warning(f"⚠️ Inference worker {worker.pid} exited with {worker.exitcode}, restarting")
+                    workers[index] = context.Process(
+                        target=run_worker, args=(address, authkey, threads), name=f"inference-{index}", daemon=True
+                    )
+                    workers[index].start()
+            stopping.wait(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            if worker is not None:
+                worker.terminate()
+
+def main():
+    from semantic_search_service import Config
+
+    parser = argparse.ArgumentParser(description="Run the IFTAA model inference pool")
+    parser.add_argument("--address", default=Config.INFERENCE_POOL_ADDRESS or "/tmp/iftaa-inference.sock",
+                        help="Unix socket of the pool's queue server (default: INFERENCE_POOL_ADDRESS)")
+    parser.add_argument("--processes", type=int, default=Config.INFERENCE_POOL_PROCESSES, help="Inference processes")
+    args = parser.parse_args()
+
+    if Config.INFERENCE_POOL_AUTHKEY:
+        authkey = Config.INFERENCE_POOL_AUTHKEY.encode("utf-8")
+    else:
+        authkey = create_authkey(authkey_path(args.address))
+        logger.info(f"🔑 Wrote a new inference pool key to {authkey_path(args.address)}")
+    serve_pool(args.address, authkey, args.processes)
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
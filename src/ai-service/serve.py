@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Preload-and-fork serving for the IFTAA AI service
+
+    python serve.py --workers 4 --bind 0.0.0.0:5001
+
+The gunicorn master loads the embedding, reranker and translation models once,
+freezes them and forks UvicornWorker processes that share the weights
+copy-on-write. Each worker opens its own MongoDB/Milvus connections and read
+models in the app lifespan (ServiceManager.initialize skips the preloaded models)
+and runs torch with (available cores // workers) intra-op threads, so the
+workers together do not oversubscribe the machine. The workers write their
+metrics to METRICS_DIR (a temporary directory unless set), cleared here before
+forking, so /metrics on any worker reports all of them.
+
+--no-preload keeps the old behavior (every worker loads its own models) for
+comparison; see benchmark_serving.py.
+"""
+
+import os
+import gc
+import tempfile
+import argparse
+import torch
+from gunicorn.app.base import BaseApplication
+
+from semantic_search_service import app, Config, Metrics, ServiceManager, logger
+
+def available_cores() -> int:
+    """CPUs this process may run on (respects cgroup/affinity limits where the OS exposes them)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def threads_per_worker(workers: int) -> int:
+    return max(1, available_cores() // max(1, workers))
+
+def freeze_models(services: ServiceManager):
+    """
+    Put the preloaded models in inference mode and move every object allocated so
+    far out of the garbage collector's reach. Tensor storages live outside the
+    Python objects, so refcount updates in the workers never touch their pages; the
+    frozen objects are no longer traversed (and written to) by the workers' collections.
+    """
+    for model in (services.embedding_model, services.reranker_model,
+                  services.translation_model_ar_en, services.translation_model_en_ar):
+        # CrossEncoder wraps its torch module
+        module = model if isinstance(model, torch.nn.Module) else getattr(model, "model", None)
+        if isinstance(module, torch.nn.Module):
+            module.eval()
+            module.requires_grad_(False)
+    gc.collect()
+    gc.freeze()
+
+class PreloadedApplication(BaseApplication):
+    """gunicorn application serving the already imported FastAPI app"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the IFTAA AI service with preloaded, shared models")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", "2")), help="Worker processes")
+    parser.add_argument("--bind", default=os.getenv("SERVE_BIND", "0.0.0.0:5001"), help="Address to listen on")
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="torch intra-op threads per worker (default: available cores // workers)")
+    parser.add_argument("--timeout", type=int, default=120, help="Worker timeout in seconds")
+    parser.add_argument("--no-preload", action="store_true", help="Load the models in every worker instead")
+    args = parser.parse_args()
+
+    threads = args.threads_per_worker or threads_per_worker(args.workers)
+    # Inherited by the forked workers
+    Config.SERVE_WORKERS = max(1, args.workers)
+    if not Config.METRICS_DIR and Config.SERVE_WORKERS > 1:
+        Config.METRICS_DIR = tempfile.mkdtemp(prefix="iftaa_metrics_")
+    if Config.METRICS_DIR:
+        Metrics.reset_directory(Config.METRICS_DIR)
+
+    if not args.no_preload:
+        # A single thread in the master: no intra-op thread pool exists when the workers are forked
+        torch.set_num_threads(1)
+        logger.info("📦 Preloading models in the master process...")
+        services = ServiceManager()
+        services.load_models()
+        freeze_models(services)
+
+    def post_fork(server, worker):
+        torch.set_num_threads(threads)
+        logger.info(f"👷 Worker {worker.pid} started with {threads} torch threads")
+
+    logger.info(f"🚀 Serving on {args.bind} with {args.workers} workers x {threads} torch threads "
+                f"({'per-worker models' if args.no_preload else 'preloaded models'})")
+    PreloadedApplication({
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": args.timeout,
+        "post_fork": post_fork,
+    }).run()
+
+if __name__ == "__main__":
+    main()
@@ -380,6 +380,25 @@ class DataLoader:
         except Exception as e:
             logger.warning(f"⚠️  Could not create unique index (may already exist): {e}")
 
+    def rebuild_hot_collection(self) -> bool:
+        """Rebuild the AI service's hot fatwa collection from the loaded fatwas"""
+        # Imported here: the service module loads the model libraries
+        from semantic_search_service import Config, HotFatwaStore
+        store = HotFatwaStore(self.db[self.mongo_collection], self.db[Config.FATWA_HOT_COLLECTION],
+                              Config.ANSWER_SNIPPET_LENGTH)
+        give_up_at = time.time() + HotFatwaStore.REBUILD_LOCK_SECONDS
+        try:
+            # A rebuild already running may have read the fatwas before this load: wait for it, then rebuild
+            while not store.rebuild():
+                if time.time() > give_up_at:
+                    logger.warning("⚠️ Hot fatwa collection is still locked by another rebuild, not rebuilt")
+                    return False
+                time.sleep(5)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Could not rebuild hot fatwa collection: {e}")
+            return False
+
     def run(self, force_reload: bool = False):
         """Main data loading process"""
         logger.info("🚀 Starting Smart Data Loader...")
@@ -418,6 +437,11 @@ class DataLoader:
         if success and not self.use_milvus_lite:
             self.finalize_milvus_server_inserts()
         
+        # The AI service serves result lists from its hot collection: bring it in line with the load
+        # (after a failed forced reload too, which has already cleared the fatwas)
+        if success or force_reload:
+            self.rebuild_hot_collection()
+        
         if success:
             logger.info("🎉 Smart Data Loader completed successfully!")
         else:
@@ -1,5 +1,6 @@
 using IFTAA_Project.Data;
 using IFTAA_Project.Models;
+using MongoDB.Bson;
 using MongoDB.Driver;
 
 namespace IFTAA_Project.Services
@@ -50,19 +51,41 @@ namespace IFTAA_Project.Services
                     )
                 );
 
-                // Text index for search functionality (title, question, answer)
-                await fatwaCollection.Indexes.CreateOneAsync(
-                    new CreateIndexModel<Models.Fatwa>(
-                        Builders<Models.Fatwa>.IndexKeys
-                            .Text(f => f.TitleAr)
-                            .Text(f => f.TitleEn)
-                            .Text(f => f.QuestionAr)
-                            .Text(f => f.QuestionEn)
-                            .Text(f => f.AnswerAr)
-                            .Text(f => f.AnswerEn),
-                        new CreateIndexOptions { Name = "idx_fulltext_search" }
-                    )
-                );
+                // Weighted text index for search functionality (title > question > answer > category).
+                // Must match Config.TEXT_INDEX_NAME / Config.TEXT_INDEX_WEIGHTS in src/ai-service/semantic_search_service.py:
+                // a collection holds a single text index, so any other definition conflicts with the AI service's
+                try
+                {
+                    await fatwaCollection.Indexes.CreateOneAsync(
+                        new CreateIndexModel<Models.Fatwa>(
+                            Builders<Models.Fatwa>.IndexKeys
+                                .Text(f => f.TitleAr)
+                                .Text(f => f.TitleEn)
+                                .Text(f => f.QuestionAr)
+                                .Text(f => f.QuestionEn)
+                                .Text(f => f.AnswerAr)
+                                .Text(f => f.AnswerEn)
+                                .Text(f => f.Category),
+                            new CreateIndexOptions
+                            {
+                                Name = "fatwa_text_index",
+                                DefaultLanguage = "none",
+                                Weights = new BsonDocument
+                                {
+                                    { "title_ar", 10 }, { "title_en", 10 },
+                                    { "question_ar", 5 }, { "question_en", 5 },
+                                    { "answer_ar", 2 }, { "answer_en", 2 },
+                                    { "category", 1 }
+                                }
+                            }
+                        )
+                    );
+                }
+                catch (MongoCommandException ex)
+                {
+                    // An older text index is in place; replacing it is a migration, not a startup step
+                    _logger.LogWarning(ex, "⚠️ Text index fatwa_text_index could not be created, run scripts/text_index_migration.py to replace the existing one");
+                }
 
                 // Index on tags for tag-based searching
                 await fatwaCollection.Indexes.CreateOneAsync(